@@ -1,190 +1,209 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 import plotly.express as px
-
-# Fetch FPL data with caching
-@st.cache_data
-def fetch_fpl_data():
-    fpl_url = "https://fantasy.premierleague.com/api/bootstrap-static/"
-    response = requests.get(fpl_url)
-    fpl_data = response.json()
-
+from plotly_resampler import FigureResampler
+
+FPL_URL = "https://fantasy.premierleague.com/api/bootstrap-static/"
+FIXTURES_URL = "https://fantasy.premierleague.com/api/fixtures/"
+SCATTER_MAX_POINTS = 2000
+POSITIONS = np.array(['Goalkeeper', 'Defender', 'Midfielder', 'Forward'], dtype=object)  # indexed by element_type - 1
+CACHE_DIR = Path('.fpl_cache')
+CACHE_TTL = 600  # seconds
+REQUEST_TIMEOUT = 5  # seconds
+
+# Share one keep-alive session across reruns so cache misses reuse the open TLS connections
+@st.cache_resource
+def get_session():
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+    return session
+
+# Return the response body for a URL, reusing an on-disk copy younger than the TTL
+def cached_get(session, url, ttl=CACHE_TTL):
+    path = CACHE_DIR / hashlib.md5(url.encode()).hexdigest()
+    if path.exists() and time.time() - path.stat().st_mtime < ttl:
+        return path.read_bytes()
+    response = session.get(url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    CACHE_DIR.mkdir(exist_ok=True)
+    # Each writer gets its own temp file so concurrent workers never clobber one another
+    with tempfile.NamedTemporaryFile(dir=CACHE_DIR, delete=False) as tmp_file:
+        tmp_file.write(response.content)
+    os.replace(tmp_file.name, path)
+    return response.content
+
+# Fetch both API endpoints concurrently
+def fetch_all():
+    session = get_session()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        fpl_future = executor.submit(cached_get, session, FPL_URL)
+        fixtures_future = executor.submit(cached_get, session, FIXTURES_URL)
+        fpl_data = orjson.loads(fpl_future.result())
+        fixtures_data = orjson.loads(fixtures_future.result())
+    return fpl_data, fixtures_data
+
+# Build a DataFrame column by column from a list of same-shaped records
+def records_to_frame(records):
+    if not records:
+        return pd.DataFrame()
+    columns = {key: [record[key] for record in records] for key in records[0]}
+    return pd.DataFrame(columns, copy=False)
+
+# Shrink numeric columns to the smallest dtype that holds their values
+def downcast(df):
+    for col in df.select_dtypes('integer'):
+        df[col] = pd.to_numeric(df[col], downcast='unsigned' if df[col].min() >= 0 else 'integer')
+    for col in df.select_dtypes('float'):
+        df[col] = pd.to_numeric(df[col], downcast='float')
+    return df
+
+# Build player and team data from the bootstrap response
+def build_players_and_teams(fpl_data):
     # Extract player and team data
-    players = pd.DataFrame(fpl_data['elements'])
-    teams = pd.DataFrame(fpl_data['teams'])
+    players = records_to_frame(fpl_data['elements'])
+    teams = records_to_frame(fpl_data['teams'])
 
     # Add new fields
     players['selected_by_percent'] = pd.to_numeric(players['selected_by_percent'], errors='coerce')
-    players['points_per_game'] = pd.to_numeric(players['points_per_game'], errors='coerce')
-    players['points_per_million'] = players['total_points'] / (players['now_cost'] / 10)
-    players['price_m'] = players['now_cost'] / 10
-
-    # Map team names and merge team strength
-    teams_mapping = teams[['id', 'name', 'strength_attack_home', 'strength_defence_away']]
-    players = players.merge(teams_mapping, left_on='team', right_on='id', how='left')
-    players['team_name'] = players['name']
-    players['position'] = players['element_type'].map({1: 'Goalkeeper', 2: 'Defender', 3: 'Midfielder', 4: 'Forward'})
-
-    return players, teams
-
-players, teams = fetch_fpl_data()
-
-# Fetch fixture data
-@st.cache_data
-def fetch_fixtures():
-    fixtures_url = "https://fantasy.premierleague.com/api/fixtures/"
-    response = requests.get(fixtures_url)
-    fixtures = pd.DataFrame(response.json())
-    return fixtures
-
-fixtures = fetch_fixtures()
-
-# App title
-st.title("FPL Insights Dashboard")
-st.subheader("Visual by FrasierFPL @frasierfpl.bsky.social")
-
-# Sidebar filters
-st.sidebar.header("Filters")
-selected_positions = st.sidebar.multiselect("Select Positions", options=players['position'].unique(), default=players['position'].unique())
-selected_teams = st.sidebar.multiselect("Select Teams", options=players['team_name'].unique(), default=players['team_name'].unique())
-max_price = st.sidebar.slider("Select Maximum Price (in £M)", min_value=float(players['price_m'].min()), max_value=float(players['price_m'].max()), value=float(players['price_m'].max()))
 
-# Apply filters
-filtered_players = players[
-    (players['position'].isin(selected_positions)) &
-    (players['team_name'].isin(selected_teams)) &
-    (players['price_m'] <= max_price)
-]
-
-# Ensure filtered_players is not empty
-if filtered_players.empty:
-    st.warning("No players match the current filters. Displaying all players instead.")
-    filtered_players = players.copy()
-
-# Ensure required columns are numeric
-numeric_columns = ['ict_index', 'points_per_game', 'form', 'points_per_million']
-for col in numeric_columns:
-    if col in filtered_players.columns:
-        filtered_players[col] = pd.to_numeric(filtered_players[col], errors='coerce').fillna(0)
-    else:
-        filtered_players[col] = 0  # Add column with default value
-
-# Tabs for insights
-tabs = st.tabs(["Captain Picks", "Differential Players", "Set-Piece Takers", "Value Picks", "Form vs Fixture Difficulty", "Team Rating"])
-
-# Tab 1: Captain Picks
-with tabs[0]:
-    st.subheader("Top 10 Captain Picks")
-    filtered_players['captaincy_score'] = filtered_players['form'] + filtered_players['ict_index']
-    top_captains = filtered_players.nlargest(10, 'captaincy_score')
-    fig = px.bar(
-        top_captains,
-        x='captaincy_score',
-        y='web_name',
-        orientation='h',
-        color='captaincy_score',
-        title="Top 10 Captain Picks",
-        labels={'web_name': 'Player', 'captaincy_score': 'Captaincy Score'},
-        color_continuous_scale='Reds'
-    )
-    fig.update_layout(yaxis=dict(categoryorder='total ascending'))
-    st.plotly_chart(fig)
-
-# Tab 2: Differential Players
-with tabs[1]:
-    st.subheader("Top 10 Differential Players")
-    filtered_players['differential_score'] = filtered_players['points_per_game'] * (1 - (filtered_players['selected_by_percent'] / 100))
-    top_differentials = filtered_players.nlargest(10, 'differential_score')
-    fig = px.bar(
-        top_differentials,
-        x='differential_score',
-        y='web_name',
-        orientation='h',
-        color='differential_score',
-        title="Top 10 Differential Players",
-        labels={'web_name': 'Player', 'differential_score': 'Differential Score'},
-        color_continuous_scale='Blues'
-    )
-    fig.update_layout(yaxis=dict(categoryorder='total ascending'))
-    st.plotly_chart(fig)
-
-# Tab 3: Set-Piece Takers
-with tabs[2]:
-    st.subheader("Top 10 Set-Piece Takers (ICT Index)")
-    top_set_piece = filtered_players.nlargest(10, 'ict_index')
-    fig = px.bar(
-        top_set_piece,
-        x='ict_index',
-        y='web_name',
-        orientation='h',
-        color='ict_index',
-        title="Top 10 Set-Piece Takers",
-        labels={'web_name': 'Player', 'ict_index': 'ICT Index'},
-        color_continuous_scale='Greens'
-    )
-    fig.update_layout(yaxis=dict(categoryorder='total ascending'))
-    st.plotly_chart(fig)
+    # Map team names and team strength by gathering rows on the team ID
+    team_lookup = teams.set_index('id').reindex(players['team'].to_numpy())
+    for player_col, team_col in [('team_name', 'name'), ('strength_attack_home', 'strength_attack_home'), ('strength_defence_away', 'strength_defence_away')]:
+        players[player_col] = team_lookup[team_col].to_numpy()
+    players['element_type'] = players['element_type'].astype(np.uint8)
+    position_codes = players['element_type'].to_numpy().astype(np.int8) - 1
+    position_codes[position_codes >= len(POSITIONS)] = -1  # Unknown element types have no position
+    players['position'] = pd.Categorical.from_codes(position_codes, categories=POSITIONS)
+
+    # Store categorical codes so the sidebar filters compare small ints instead of strings
+    players['team_name'] = players['team_name'].astype('category')
+    players['position_code'] = players['position'].cat.codes
+    players['team_code'] = players['team_name'].cat.codes
+
+    # Ensure required columns are numeric
+    numeric_columns = ['ict_index', 'points_per_game', 'form']
+    for col in numeric_columns:
+        if col in players.columns:
+            players[col] = pd.to_numeric(players[col], errors='coerce').fillna(0)
+        else:
+            players[col] = 0  # Add column with default value
+
+    # Precompute insight scores so reruns only filter and rank, fusing the arithmetic in numexpr
+    players = players.eval("""
+        price_m = now_cost / 10
+        points_per_million = total_points / price_m
+        captaincy_score = form + ict_index
+        differential_score = points_per_game * (1 - selected_by_percent / 100)
+    """, engine='numexpr')
+    strength_attack = players['strength_attack_home']
+    strength_defence = players['strength_defence_away']
+    players['fixture_difficulty'] = ((strength_attack + strength_defence) * 0.5).where(strength_attack.notna(), 0.0)
+    players['points_per_million'] = players['points_per_million'].clip(lower=0)
+
+    return downcast(players), teams
+
+# Build fixture data from the fixtures response
+def build_fixtures(fixtures_data):
+    fixtures = pd.DataFrame(fixtures_data)
+    return fixtures
 
-# Tab 4: Value Picks
-with tabs[3]:
-    st.subheader("Top 10 Value Picks (Points per Million)")
-    top_value_picks = filtered_players.nlargest(10, 'points_per_million')
+# Fetch and build all data with caching, so players and fixtures share one snapshot and one TTL
+@st.cache_data(ttl=CACHE_TTL)
+def load_data():
+    fpl_data, fixtures_data = fetch_all()
+    players, teams = build_players_and_teams(fpl_data)
+    return players, teams, build_fixtures(fixtures_data)
+
+players, teams, fixtures = load_data()
+
+# Select the top k rows by a column using a partial partition instead of a full sort
+# Matches nlargest(k, col): NaNs are dropped and ties keep the first row by position
+def top_k(df, col, k=10):
+    values = df[col].to_numpy(dtype=float)
+    candidates = np.flatnonzero(~np.isnan(values))
+    if len(candidates) > k:
+        kth = np.partition(values[candidates], len(candidates) - k)[len(candidates) - k]
+        candidates = candidates[values[candidates] >= kth]
+    order = np.lexsort((candidates, -values[candidates]))[:k]
+    return df.iloc[candidates[order]]
+
+# Hash a DataFrame by its contents for st.cache_data keys
+def hash_frame(df):
+    return pd.util.hash_pandas_object(df, index=False).values.tobytes()
+
+# Build a top 10 bar chart, cached on the contents of the small ranked frame
+@st.cache_data(max_entries=64, hash_funcs={pd.DataFrame: hash_frame})
+def make_bar(top_players, col, title, label, color_scale):
     fig = px.bar(
-        top_value_picks,
-        x='points_per_million',
+        top_players,
+        x=col,
         y='web_name',
         orientation='h',
-        color='points_per_million',
-        title="Top 10 Value Picks",
-        labels={'web_name': 'Player', 'points_per_million': 'Points per Million'},
-        color_continuous_scale='Purples'
+        color=col,
+        title=title,
+        labels={'web_name': 'Player', col: label},
+        color_continuous_scale=color_scale
     )
     fig.update_layout(yaxis=dict(categoryorder='total ascending'))
-    st.plotly_chart(fig)
-
-# Tab 5: Form vs Fixture Difficulty
-with tabs[4]:
-    st.subheader("Form vs Fixture Difficulty")
-    filtered_players['fixture_difficulty'] = filtered_players.apply(
-        lambda x: (x['strength_attack_home'] + x['strength_defence_away']) / 2 if pd.notnull(x['strength_attack_home']) else 0, axis=1
-    )
-    filtered_players['points_per_million'] = filtered_players['points_per_million'].apply(lambda x: max(x, 0))
-    fig = px.scatter(
-        filtered_players,
-        x='fixture_difficulty',
-        y='form',
-        size='points_per_million',
-        color='points_per_million',
-        hover_name='web_name',
-        title="Form vs Fixture Difficulty",
-        labels={'fixture_difficulty': 'Fixture Difficulty', 'form': 'Form'},
-        color_continuous_scale='Blues'
-    )
-    st.plotly_chart(fig)
-
-# Tab 6: Team Ratings
-with tabs[5]:
-    st.subheader("Premier League Team Ratings")
-
+    return fig
+
+# Precompute a 256-entry Blues palette (matplotlib's ColorBrewer anchors) with readable text colours
+BLUES_ANCHORS = np.array([
+    [247, 251, 255], [222, 235, 247], [198, 219, 239], [158, 202, 225], [107, 174, 214],
+    [66, 146, 198], [33, 113, 181], [8, 81, 156], [8, 48, 107]
+], dtype=float)
+_palette_positions = np.linspace(0, 1, 256)
+_anchor_positions = np.linspace(0, 1, len(BLUES_ANCHORS))
+BLUES_PALETTE = np.column_stack([
+    np.interp(_palette_positions, _anchor_positions, BLUES_ANCHORS[:, channel]) for channel in range(3)
+]).round().astype(np.uint8)
+_linear_rgb = BLUES_PALETTE / 255
+_linear_rgb = np.where(_linear_rgb <= 0.04045, _linear_rgb / 12.92, ((_linear_rgb + 0.055) / 1.055) ** 2.4)
+_luminance = _linear_rgb @ np.array([0.2126, 0.7152, 0.0722])
+BLUES_STYLES = np.array([
+    f"background-color: #{r:02x}{g:02x}{b:02x};color: {'#f1f1f1' if lum < 0.408 else '#000000'}"
+    for (r, g, b), lum in zip(BLUES_PALETTE, _luminance)
+], dtype=object)
+
+# Map a numeric column onto the Blues palette, scaled between its own min and max
+def blues_gradient(col):
+    values = col.to_numpy(dtype=float)
+    span = values.max() - values.min()
+    norm = (values - values.min()) / span if span > 0 else np.zeros_like(values)
+    return BLUES_STYLES[np.minimum((norm * 256).astype(int), 255)]
+
+# Build the team ratings table, which depends only on the fetched teams and fixtures
+@st.cache_data(hash_funcs={pd.DataFrame: hash_frame})
+def compute_team_ratings(teams, fixtures):
     # Process completed fixtures to calculate goals scored and conceded
     completed_fixtures = fixtures[fixtures['finished'] == True]
 
-    # Home stats
-    home_stats = completed_fixtures[['team_h', 'team_h_score']].copy()
-    home_stats.rename(columns={'team_h': 'team', 'team_h_score': 'goals_scored'}, inplace=True)
-    home_stats['goals_conceded'] = completed_fixtures['team_a_score']
-
-    # Away stats
-    away_stats = completed_fixtures[['team_a', 'team_a_score']].copy()
-    away_stats.rename(columns={'team_a': 'team', 'team_a_score': 'goals_scored'}, inplace=True)
-    away_stats['goals_conceded'] = completed_fixtures['team_h_score']
-
-    # Combine home and away stats
-    all_stats = pd.concat([home_stats, away_stats])
-
-    # Aggregate goals scored and conceded for each team
-    team_goals = all_stats.groupby('team').sum().reset_index()
+    # Home and away sides and scores
+    home_teams = completed_fixtures['team_h'].to_numpy(dtype=int)
+    away_teams = completed_fixtures['team_a'].to_numpy(dtype=int)
+    home_scores = completed_fixtures['team_h_score'].to_numpy(dtype=float)
+    away_scores = completed_fixtures['team_a_score'].to_numpy(dtype=float)
+
+    # Aggregate goals scored and conceded for each team ID in a single pass
+    team_ids = teams['id'].to_numpy(dtype=int)
+    n_ids = team_ids.max() + 1
+    goals_scored = np.bincount(home_teams, home_scores, n_ids) + np.bincount(away_teams, away_scores, n_ids)
+    goals_conceded = np.bincount(home_teams, away_scores, n_ids) + np.bincount(away_teams, home_scores, n_ids)
+    team_goals = pd.DataFrame({
+        'team': team_ids,
+        'goals_scored': goals_scored[team_ids],
+        'goals_conceded': goals_conceded[team_ids]
+    })
 
     # Map team IDs to team names
     team_id_name_mapping = teams[['id', 'name']].copy()
@@ -225,15 +244,114 @@ with tabs[5]:
     for col in ['Attack Rating', 'Defence Rating', 'Overall Rating', 'Goals Scored', 'Goals Conceded', 'Goal Difference']:
         team_ratings_display[col] = team_ratings_display[col].astype(int)
 
-    # Apply color gradient to the DataFrame
-    styled_table = (
-        team_ratings_display.style
-        .background_gradient(subset=['Attack Rating', 'Defence Rating', 'Overall Rating', 'Goals Scored', 'Goals Conceded', 'Goal Difference'], cmap='Blues')
-        .set_table_styles([
-            {'selector': 'th', 'props': [('font-size', '16px'), ('text-align', 'center'), ('font-weight', 'bold')]},
-            {'selector': 'td', 'props': [('font-size', '14px'), ('text-align', 'center')]}
-        ])
-    )
+    return team_ratings_display
+
+# App title
+st.title("FPL Insights Dashboard")
+st.subheader("Visual by FrasierFPL @frasierfpl.bsky.social")
+
+# Sidebar filters
+st.sidebar.header("Filters")
+position_options = players['position'].cat.categories
+team_options = players['team_name'].cat.categories
+selected_positions = st.sidebar.multiselect("Select Positions", options=position_options, default=position_options)
+selected_teams = st.sidebar.multiselect("Select Teams", options=team_options, default=team_options)
+max_price = st.sidebar.slider("Select Maximum Price (in £M)", min_value=round(float(players['price_m'].min()), 1), max_value=round(float(players['price_m'].max()), 1), value=round(float(players['price_m'].max()), 1), step=0.1)
+
+# Apply filters
+# Per-category lookups with a trailing False so missing values (code -1) never match
+position_selected = np.append(position_options.isin(selected_positions), False)
+team_selected = np.append(team_options.isin(selected_teams), False)
+mask = (
+    position_selected[players['position_code'].to_numpy()] &
+    team_selected[players['team_code'].to_numpy()] &
+    (players['now_cost'].to_numpy() <= round(max_price * 10))
+)
+filtered_players = players.iloc[np.flatnonzero(mask)]
 
-    # Display styled table
-    st.write(styled_table.to_html(), unsafe_allow_html=True)
+# Ensure filtered_players is not empty
+# filtered_players is only read from here on, so the fallback can share the cached frame
+if filtered_players.empty:
+    st.warning("No players match the current filters. Displaying all players instead.")
+    filtered_players = players
+
+# Tabs for insights; on_change="rerun" lets each body check whether its tab is open
+tab_names = ["Captain Picks", "Differential Players", "Set-Piece Takers", "Value Picks", "Form vs Fixture Difficulty", "Team Rating"]
+tabs = st.tabs(tab_names, key='active_tab', on_change="rerun")
+
+# Tab 1: Captain Picks
+with tabs[0]:
+    if tabs[0].open:
+        st.subheader("Top 10 Captain Picks")
+        top_captains = top_k(filtered_players, 'captaincy_score')
+        fig = make_bar(top_captains[['web_name', 'captaincy_score']], 'captaincy_score', "Top 10 Captain Picks", 'Captaincy Score', 'Reds')
+        st.plotly_chart(fig)
+
+# Tab 2: Differential Players
+with tabs[1]:
+    if tabs[1].open:
+        st.subheader("Top 10 Differential Players")
+        top_differentials = top_k(filtered_players, 'differential_score')
+        fig = make_bar(top_differentials[['web_name', 'differential_score']], 'differential_score', "Top 10 Differential Players", 'Differential Score', 'Blues')
+        st.plotly_chart(fig)
+
+# Tab 3: Set-Piece Takers
+with tabs[2]:
+    if tabs[2].open:
+        st.subheader("Top 10 Set-Piece Takers (ICT Index)")
+        top_set_piece = top_k(filtered_players, 'ict_index')
+        fig = make_bar(top_set_piece[['web_name', 'ict_index']], 'ict_index', "Top 10 Set-Piece Takers", 'ICT Index', 'Greens')
+        st.plotly_chart(fig)
+
+# Tab 4: Value Picks
+with tabs[3]:
+    if tabs[3].open:
+        st.subheader("Top 10 Value Picks (Points per Million)")
+        top_value_picks = top_k(filtered_players, 'points_per_million')
+        fig = make_bar(top_value_picks[['web_name', 'points_per_million']], 'points_per_million', "Top 10 Value Picks", 'Points per Million', 'Purples')
+        st.plotly_chart(fig)
+
+# Tab 5: Form vs Fixture Difficulty
+with tabs[4]:
+    if tabs[4].open:
+        st.subheader("Form vs Fixture Difficulty")
+        # LTTB-downsample once the point count outgrows what the browser renders comfortably.
+        # st.plotly_chart has no Dash callback, so this is a single static cut that does not
+        # re-sample on zoom, and with few distinct x values it drops players outright.
+        resample = len(filtered_players) > SCATTER_MAX_POINTS
+        scatter_players = filtered_players.sort_values('fixture_difficulty') if resample else filtered_players  # LTTB needs monotonic x
+        fig = px.scatter(
+            scatter_players,
+            x='fixture_difficulty',
+            y='form',
+            size='points_per_million',
+            color='points_per_million',
+            hover_name='web_name',
+            render_mode='webgl',
+            title="Form vs Fixture Difficulty",
+            labels={'fixture_difficulty': 'Fixture Difficulty', 'form': 'Form'},
+            color_continuous_scale='Blues'
+        )
+        if resample:
+            fig = FigureResampler(fig, default_n_shown_samples=SCATTER_MAX_POINTS)
+        st.plotly_chart(fig)
+
+# Tab 6: Team Ratings
+with tabs[5]:
+    if tabs[5].open:
+        st.subheader("Premier League Team Ratings")
+
+        team_ratings_display = compute_team_ratings(teams, fixtures[['finished', 'team_h', 'team_a', 'team_h_score', 'team_a_score']])
+
+        # Apply color gradient to the DataFrame
+        styled_table = (
+            team_ratings_display.style
+            .apply(blues_gradient, subset=['Attack Rating', 'Defence Rating', 'Overall Rating', 'Goals Scored', 'Goals Conceded', 'Goal Difference'])
+            .set_table_styles([
+                {'selector': 'th', 'props': [('font-size', '16px'), ('text-align', 'center'), ('font-weight', 'bold')]},
+                {'selector': 'td', 'props': [('font-size', '14px'), ('text-align', 'center')]}
+            ])
+        )
+
+        # Display styled table
+        st.write(styled_table.to_html(), unsafe_allow_html=True)